@@ -0,0 +1,23 @@
+# cython: language_level=3
+"""Cython fast path for packing PyMuPDF block tuples into columnar arrays.
+
+Build in place with:
+    cythonize -3 -i server/_fastpack.pyx
+
+pymupdf_service falls back to a pure-Python implementation when this
+compiled module is absent, so building it is optional.
+"""
+
+def pack_blocks(list blocks):
+    """Split get_text("blocks") tuples into (types, texts, bboxes) columns"""
+    cdef Py_ssize_t n = len(blocks)
+    cdef Py_ssize_t i
+    cdef list types = [None] * n
+    cdef list texts = [None] * n
+    cdef list bboxes = [None] * n
+    for i in range(n):
+        b = blocks[i]
+        types[i] = b[6]
+        texts[i] = b[4]
+        bboxes[i] = (b[0], b[1], b[2], b[3])
+    return types, texts, bboxes
